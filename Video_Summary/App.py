@@ -2,23 +2,42 @@ import streamlit as st
 from phi.agent import Agent
 from phi.model.google import Gemini
 from phi.tools.duckduckgo import DuckDuckGo
-from google.generativeai import upload_file, get_file
+from google.generativeai import upload_file, get_file, delete_file
 import google.generativeai as genai
 
 import time
+import asyncio
+import hashlib
+import functools
+import threading
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    TimeoutError as FuturesTimeoutError,
+    wait,
+)
 from pathlib import Path
 
+import httpx
+import shutil
+import subprocess
 import tempfile
 
 from dotenv import load_dotenv
 
-load_dotenv()
-
 import os
 
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if API_KEY:
-    genai.configure(api_key=API_KEY)
+
+@st.cache_resource(show_spinner=False)
+def configure_genai():
+    """Load the environment and configure Gemini once per process, not per rerun."""
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if api_key:
+        genai.configure(api_key=api_key)
+    return api_key
+
+
+API_KEY = configure_genai()
 
 # Page configuration
 st.set_page_config(
@@ -28,9 +47,53 @@ st.set_page_config(
 st.title("Phidata Video AI Summarizer Agent 🎥🎤🖬")
 st.header("Powered by Gemini 2.0 Flash Exp")
 
+# Uploads are copied to disk in chunks of this size instead of one full read
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Gemini's limits for video input; larger files are rejected before upload
+MAX_VIDEO_BYTES = 2 * 1024**3
+MAX_VIDEO_SECONDS = 3600
+
+# Uploaded Gemini files are reused for identical videos until shortly before
+# Gemini's 48 hour retention expires them
+GENAI_FILE_TTL = 47 * 3600
+# At most this many uploads are kept per session; the least recently used one
+# is released first
+MAX_CACHED_VIDEOS = 3
+
+# Re-encode videos to 720p H.264 before upload when ffmpeg is available; the
+# smaller file is only used if it actually saves bytes
+TRANSCODE_VIDEO = True
+
+# Limits (seconds) for the ffprobe and ffmpeg subprocesses
+PROBE_TIMEOUT = 30
+TRANSCODE_TIMEOUT = 600
+
+# How long Analyze waits (seconds) for the background upload before asking the
+# user to try again
+UPLOAD_WAIT = 120
+
+# Per-call timeouts (seconds) for Gemini requests; timed-out calls are retried
+POLL_TIMEOUT = 15
+AGENT_TIMEOUT = 90  # max wait for each streamed chunk of the answer
+MAX_RETRIES = 3
+
+# Processing-state polling backs off exponentially between these bounds (seconds)
+POLL_INITIAL_DELAY = 0.25
+POLL_MAX_DELAY = 4.0
+
+# Gemini requests in flight across all sessions; extra calls wait for a slot.
+# Uploads have their own cap so long transfers can't starve requests/streams.
+MAX_CONCURRENT_GENAI_CALLS = 5
+MAX_CONCURRENT_UPLOADS = 3
+
+# Gemini REST endpoint used to poll file processing state
+GENAI_API_URL = "https://generativelanguage.googleapis.com/v1beta/"
+
 
-@st.cache_resource
 def initialize_agent():
+    # Not cached: phi streams from per-run state on the agent instance, so
+    # concurrent sessions sharing one agent could see each other's chunks
     return Agent(
         name="Video AI Summarizer",
         model=Gemini(id="gemini-2.0-flash-exp"),
@@ -39,8 +102,378 @@ def initialize_agent():
     )
 
 
-## Initialize the agent
-multimodal_Agent = initialize_agent()
+@st.cache_resource
+def get_executor():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="genai")
+
+
+@st.cache_resource
+def get_genai_semaphore():
+    return threading.BoundedSemaphore(MAX_CONCURRENT_GENAI_CALLS)
+
+
+@st.cache_resource
+def get_upload_semaphore():
+    return threading.BoundedSemaphore(MAX_CONCURRENT_UPLOADS)
+
+
+def acquire_genai_slot(timeout):
+    """Take a shared Gemini slot, raising TimeoutError if none frees up in time."""
+    semaphore = get_genai_semaphore()
+    if not semaphore.acquire(timeout=timeout):
+        raise TimeoutError(f"Gemini is busy; no request slot freed up within {timeout}s")
+    return semaphore
+
+
+def call_with_timeout(func, *args, timeout, retries=MAX_RETRIES, **kwargs):
+    """Run a blocking Gemini call with a per-call timeout, retrying on timeout.
+
+    Calls share a process-wide concurrency cap. The slot is held until the call
+    really finishes, so abandoned calls still count against the cap.
+    """
+    for attempt in range(1, retries + 1):
+        semaphore = acquire_genai_slot(timeout)
+        try:
+            future = get_executor().submit(func, *args, **kwargs)
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda _: semaphore.release())
+        try:
+            return future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            future.cancel()
+            if attempt == retries:
+                raise TimeoutError(
+                    f"{func.__name__} timed out after {retries} attempts of {timeout}s"
+                )
+
+
+def probe_duration(video_path):
+    """Return the video length in seconds, or None if ffprobe can't tell."""
+    if shutil.which("ffprobe") is None:
+        return None
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                video_path,
+            ],
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT,
+        )
+        return float(result.stdout.strip())
+    except (subprocess.TimeoutExpired, ValueError):
+        return None
+
+
+def transcode_video(video_path):
+    """Return the path of a smaller 720p re-encode of the video, or the original."""
+    if not TRANSCODE_VIDEO or shutil.which("ffmpeg") is None:
+        return video_path
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
+        transcoded_path = temp_video.name
+    try:
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-y",
+                "-v",
+                "error",
+                "-i",
+                video_path,
+                "-vf",
+                "scale=-2:'min(720,ih)'",
+                "-c:v",
+                "libx264",
+                "-preset",
+                "veryfast",
+                "-crf",
+                "28",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "96k",
+                transcoded_path,
+            ],
+            capture_output=True,
+            timeout=TRANSCODE_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        Path(transcoded_path).unlink(missing_ok=True)
+        return video_path
+
+    if (
+        result.returncode == 0
+        and Path(transcoded_path).stat().st_size < Path(video_path).stat().st_size
+    ):
+        Path(video_path).unlink(missing_ok=True)
+        return transcoded_path
+
+    Path(transcoded_path).unlink(missing_ok=True)
+    return video_path
+
+
+def check_video_size(video_file):
+    """Reject uploads over Gemini's size limit before anything is copied."""
+    if video_file.size > MAX_VIDEO_BYTES:
+        raise ValueError(
+            f"Video is {video_file.size / 1024**3:.1f} GB; the limit is "
+            f"{MAX_VIDEO_BYTES / 1024**3:.0f} GB."
+        )
+
+
+def process_video(video_data):
+    """Save uploaded video bytes to a temp file, rejecting videos Gemini can't take.
+
+    video_data is a memoryview over the upload, read by slicing so it never
+    moves the UploadedFile's position, which st.video also uses. It is
+    released once copied. Returns the temp file path and the SHA-256 digest of
+    the video content.
+    """
+    hasher = hashlib.sha256()
+    with video_data, tempfile.NamedTemporaryFile(
+        delete=False, suffix=".mp4"
+    ) as temp_video:
+        for start in range(0, len(video_data), UPLOAD_CHUNK_SIZE):
+            chunk = video_data[start : start + UPLOAD_CHUNK_SIZE]
+            hasher.update(chunk)
+            temp_video.write(chunk)
+        video_path = temp_video.name
+
+    duration = probe_duration(video_path)
+    if duration is not None and duration > MAX_VIDEO_SECONDS:
+        Path(video_path).unlink(missing_ok=True)
+        raise ValueError(
+            f"Video is {duration / 60:.0f} minutes long; the limit is "
+            f"{MAX_VIDEO_SECONDS // 60} minutes."
+        )
+
+    return video_path, hasher.hexdigest()
+
+
+@st.cache_resource
+def get_upload_executor():
+    # Kept apart from get_executor() so background uploads can't starve the
+    # per-call workers they wait on
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="video-upload")
+
+
+@st.cache_resource(show_spinner=False)
+def get_poll_loop():
+    """Start one event loop thread that multiplexes every file-state poll."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="genai-poll", daemon=True).start()
+    client = httpx.AsyncClient(
+        base_url=GENAI_API_URL,
+        headers={"x-goog-api-key": API_KEY or ""},
+        timeout=POLL_TIMEOUT,
+        limits=httpx.Limits(max_connections=MAX_CONCURRENT_GENAI_CALLS),
+    )
+    return loop, client
+
+
+async def wait_until_processed(client, file_name):
+    """Poll a Gemini file over REST until it is no longer PROCESSING."""
+    delay = POLL_INITIAL_DELAY
+    timeouts = 0
+    while True:
+        try:
+            response = await client.get(file_name)
+        except httpx.TimeoutException:
+            timeouts += 1
+            if timeouts == MAX_RETRIES:
+                raise
+        else:
+            # Only timeouts in a row give up; scattered ones are transient
+            timeouts = 0
+            response.raise_for_status()
+            if response.json().get("state") != "PROCESSING":
+                return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, POLL_MAX_DELAY)
+
+
+def upload_video(video_path):
+    """Upload a video to Gemini, returning the file as soon as the transfer ends."""
+    # Only new content gets here, so duplicates never pay for a re-encode
+    video_path = transcode_video(video_path)
+
+    # Upload once and without a timeout: an abandoned upload would still finish
+    # and leave behind a Gemini file that nothing deletes
+    try:
+        semaphore = get_upload_semaphore()
+        if not semaphore.acquire(timeout=UPLOAD_WAIT):
+            raise TimeoutError(
+                f"Too many uploads in progress; none finished within {UPLOAD_WAIT}s"
+            )
+        try:
+            return upload_file(video_path)
+        finally:
+            semaphore.release()
+    finally:
+        # The local copy is only needed for this upload; a failed upload is
+        # prepared again from the uploaded bytes
+        Path(video_path).unlink(missing_ok=True)
+
+
+async def upload_and_process(client, executor, video_path):
+    """Upload a video on the pool, then wait for processing on the event loop.
+
+    Only the upload itself occupies a worker thread; the processing wait is a
+    coroutine, so the worker is free again as soon as the transfer ends.
+    """
+    loop = asyncio.get_running_loop()
+    processed_video = await loop.run_in_executor(executor, upload_video, video_path)
+    try:
+        if processed_video.state.name == "PROCESSING":
+            await wait_until_processed(client, processed_video.name)
+            # Fetch the final file handle once processing is over
+            processed_video = await loop.run_in_executor(
+                None,
+                functools.partial(
+                    call_with_timeout,
+                    get_file,
+                    processed_video.name,
+                    timeout=POLL_TIMEOUT,
+                ),
+            )
+        # Never cache a file Gemini failed to process; it would be reused for
+        # every later upload of the same content
+        if processed_video.state.name != "ACTIVE":
+            raise RuntimeError(
+                f"Gemini could not process the video (state {processed_video.state.name})"
+            )
+    except Exception:
+        await loop.run_in_executor(None, delete_file, processed_video.name)
+        raise
+    return processed_video
+
+
+def start_upload(video_path, executor):
+    """Start uploading a video; returns a future of its ready Gemini file."""
+    loop, client = get_poll_loop()
+    return asyncio.run_coroutine_threadsafe(
+        upload_and_process(client, executor, video_path), loop
+    )
+
+
+def prepare_video(video_data, genai_files, executor):
+    """Save a video and start its Gemini upload, reusing uploads of the same content.
+
+    Returns the content digest, which keys the video's entry in genai_files.
+    """
+    video_path, digest = process_video(video_data)
+    if digest in genai_files:
+        # Same content as an earlier upload, so reuse its Gemini file and mark
+        # it most recently used
+        Path(video_path).unlink(missing_ok=True)
+        genai_files[digest] = genai_files.pop(digest)
+    else:
+        genai_files[digest] = {
+            "path": video_path,
+            "upload": start_upload(video_path, executor),
+            "created": time.time(),
+        }
+        while len(genai_files) > MAX_CACHED_VIDEOS:
+            release_video(genai_files.pop(next(iter(genai_files))))
+    return digest
+
+
+def is_stale(prepare_job, genai_files):
+    """Whether a finished prepare job has to run again for the same upload.
+
+    That is the case when it failed unexpectedly (a ValueError is a rejected
+    video and stays shown) or its upload has since left genai_files.
+    """
+    if not prepare_job.done():
+        return False
+    error = prepare_job.exception()
+    if error is not None:
+        return not isinstance(error, ValueError)
+    return prepare_job.result() not in genai_files
+
+
+def wait_for_video(prepare_job, genai_files):
+    """Return the prepared video's Gemini file, or None if it isn't ready in time."""
+    if not wait([prepare_job], timeout=UPLOAD_WAIT).done:
+        return None
+    digest = prepare_job.result()
+
+    upload = genai_files[digest]["upload"]
+    if not wait([upload], timeout=UPLOAD_WAIT).done:
+        return None
+    if upload.exception() is not None:
+        # Forget the failed upload so the next rerun prepares the video again
+        release_video(genai_files.pop(digest))
+    return upload.result()
+
+
+def release_video(cached_video):
+    """Delete a cached video's Gemini file and any leftover local temp file."""
+    executor = get_executor()
+
+    def delete_uploaded(upload):
+        # An in-flight upload finishes on the poll loop thread, so hand the
+        # blocking delete to the pool instead of stalling every poll
+        if upload.exception() is None:
+            executor.submit(delete_file, upload.result().name)
+
+    # Runs immediately if the upload is done, otherwise once it finishes
+    cached_video["upload"].add_done_callback(delete_uploaded)
+    Path(cached_video["path"]).unlink(missing_ok=True)
+
+
+def stream_analysis(agent, analysis_prompt, processed_video):
+    """Yield the agent's answer as it is generated.
+
+    The whole stream holds one Gemini slot, and AGENT_TIMEOUT bounds the wait
+    for each chunk instead of the whole answer.
+    """
+    semaphore = acquire_genai_slot(AGENT_TIMEOUT)
+    pending = None
+    try:
+        chunks = agent.run(analysis_prompt, videos=[processed_video], stream=True)
+        while True:
+            pending = get_executor().submit(next, chunks, None)
+            # wait() rather than result(timeout=...) so a TimeoutError raised by
+            # the stream itself isn't mistaken for a stall
+            if not wait([pending], timeout=AGENT_TIMEOUT).done:
+                raise TimeoutError(f"Gemini sent nothing for {AGENT_TIMEOUT}s")
+            chunk = pending.result()
+            if chunk is None:
+                return
+            if chunk.content:
+                yield chunk.content
+    finally:
+        # An abandoned chunk fetch keeps the slot until it really finishes
+        if pending is not None:
+            pending.add_done_callback(lambda _: semaphore.release())
+        else:
+            semaphore.release()
+
+
+ANALYSIS_PROMPT_TEMPLATE = """
+Analyze the uploaded video for content and context.
+Respond to the following query using video insights and supplementary web research:
+{user_query}
+
+Provide a detailed, user-friendly, and actionable response.
+"""
+
+
+@functools.lru_cache(maxsize=128)
+def build_analysis_prompt(user_query):
+    return ANALYSIS_PROMPT_TEMPLATE.format(user_query=user_query)
+
 
 # File uploader
 video_file = st.file_uploader(
@@ -49,12 +482,47 @@ video_file = st.file_uploader(
     help="Upload a video for AI analysis",
 )
 
+# Uploads by content digest, shared by every video this session has seen
+genai_files = st.session_state.setdefault("genai_files", {})
+for digest, cached_video in list(genai_files.items()):
+    if time.time() - cached_video["created"] > GENAI_FILE_TTL:
+        release_video(genai_files.pop(digest))
+
 if video_file:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-        temp_video.write(video_file.read())
-        video_path = temp_video.name
+    prepared_video = st.session_state.get("prepared_video")
+    if (
+        prepared_video is None
+        or prepared_video["file_id"] != video_file.file_id
+        or is_stale(prepared_video["job"], genai_files)
+    ):
+        st.session_state.pop("prepared_video", None)
+        try:
+            check_video_size(video_file)
+        except ValueError as error:
+            st.error(str(error))
+            st.stop()
+
+        # Save, hash and upload off the script thread so the preview and the
+        # query box render straight away. The job gets a memoryview snapshot
+        # because st.video seeks the shared UploadedFile on every rerun.
+        executor = get_upload_executor()
+        prepared_video = {
+            "file_id": video_file.file_id,
+            "job": executor.submit(
+                prepare_video, video_file.getbuffer(), genai_files, executor
+            ),
+        }
+        st.session_state.prepared_video = prepared_video
+
+    if prepared_video["job"].done() and isinstance(
+        prepared_video["job"].exception(), ValueError
+    ):
+        st.error(str(prepared_video["job"].exception()))
+        st.stop()
 
-    st.video(video_path, format="video/mp4", start_time=0)
+    # Preview from the upload already held in memory rather than reading the
+    # temp file back from disk on every rerun
+    st.video(video_file, format="video/mp4", start_time=0)
 
     user_query = st.text_area(
         "What insights are you seeking from the video?",
@@ -68,36 +536,28 @@ if video_file:
         else:
             try:
                 with st.spinner("Processing video and gathering insights..."):
-                    # Upload and process video file
-                    processed_video = upload_file(video_path)
-                    while processed_video.state.name == "PROCESSING":
-                        time.sleep(1)
-                        processed_video = get_file(processed_video.name)
+                    processed_video = wait_for_video(prepared_video["job"], genai_files)
 
                     # Prompt generation for analysis
-                    analysis_prompt = f"""
-                        Analyze the uploaded video for content and context.
-                        Respond to the following query using video insights and supplementary web research:
-                        {user_query}
+                    analysis_prompt = build_analysis_prompt(user_query)
 
-                        Provide a detailed, user-friendly, and actionable response.
-                        """
-
-                    # AI agent processing
-                    response = multimodal_Agent.run(
-                        analysis_prompt, videos=[processed_video]
+                if processed_video is None:
+                    st.warning(
+                        "Gemini is still processing the video. Please try again in a moment."
+                    )
+                else:
+                    # Display the result as it streams in
+                    st.subheader("Analysis Result")
+                    st.write_stream(
+                        stream_analysis(
+                            initialize_agent(), analysis_prompt, processed_video
+                        )
                     )
-
-                # Display the result
-                st.subheader("Analysis Result")
-                st.markdown(response.content)
 
             except Exception as error:
                 st.error(f"An error occurred during analysis: {error}")
-            finally:
-                # Clean up temporary video file
-                Path(video_path).unlink(missing_ok=True)
 else:
+    st.session_state.pop("prepared_video", None)
     st.info("Upload a video file to begin analysis.")
 
 # Customize text area height
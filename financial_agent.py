@@ -1,28 +1,102 @@
 import os
+import re
+import json
+import asyncio
+import time
+import functools
+import httpx
+from groq import Groq as GroqClient
 from phi.agent import Agent
 from phi.model.groq import Groq
 from phi.tools.yfinance import YFinanceTools
 from phi.tools.duckduckgo import DuckDuckGo
+from dotenv import load_dotenv
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ParallelYFinanceTools(YFinanceTools):
+    """YFinanceTools with a combined tool that runs the common lookups concurrently"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.register(self.get_stock_overview)
+
+    def get_stock_overview(self, symbol: str) -> str:
+        """Use this function to get the current price, analyst recommendations and fundamentals for a stock in one call.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            str: JSON with the current price, analyst recommendations and fundamentals.
+        """
+        fetchers = {
+            "current_price": self.get_current_stock_price,
+            "analyst_recommendations": self.get_analyst_recommendations,
+            "fundamentals": self.get_stock_fundamentals,
+        }
+        with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+            futures = {key: executor.submit(fetch, symbol) for key, fetch in fetchers.items()}
+            results = {key: future.result() for key, future in futures.items()}
+
+        # Most fetchers already return JSON; decode it so it isn't encoded twice
+        overview = {}
+        for key, result in results.items():
+            try:
+                overview[key] = json.loads(result)
+            except (TypeError, ValueError):
+                overview[key] = result
+        return json.dumps(overview, indent=2)
+
+
+def build_groq_model(groq_api_key, http_client=None):
+    """
+    Create the Groq model for a single agent
+
+    phi registers an agent's tools on its model, so agents must not share one.
+
+    Args:
+        groq_api_key: Your Groq API key
+        http_client: Optional httpx client to reuse connections across models
+    """
+    return Groq(
+        api_key=groq_api_key,
+        id="llama-3.3-70b-versatile",
+        temperature=0.7,
+        http_client=http_client,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_http_client():
+    """
+    Return the process-wide httpx client shared by all Groq models
+
+    phi builds a new Groq client per request, so sharing one httpx client keeps
+    connections alive between them.
+    """
+    return httpx.Client(limits=httpx.Limits(max_keepalive_connections=20))
 
 
 def setup_groq_agent(groq_api_key):
     """
     Set up a Groq-based agent with financial and web search capabilities
 
+    Each call builds fresh agents; only the HTTP connection pool is shared.
+    phi keeps every run in agent.memory, so build a new agent for each
+    long-running task instead of reusing one indefinitely.
+
     Args:
         groq_api_key: Your Groq API key
     """
     try:
-        # Configure the Groq model
-        groq_model = Groq(
-            api_key=groq_api_key, id="llama-3.3-70b-versatile", temperature=0.7
-        )
+        http_client = get_http_client()
 
         # Create the web search agent
         web_agent = Agent(
             name="web_agent",
-            model=groq_model,
+            model=build_groq_model(groq_api_key, http_client),
             tools=[DuckDuckGo()],
             instructions=[
                 "Search for relevant news and information",
@@ -36,9 +110,9 @@ def setup_groq_agent(groq_api_key):
         # Create the financial analysis agent
         finance_agent = Agent(
             name="finance_agent",
-            model=groq_model,
+            model=build_groq_model(groq_api_key, http_client),
             tools=[
-                YFinanceTools(
+                ParallelYFinanceTools(
                     stock_price=True,
                     analyst_recommendations=True,
                     stock_fundamentals=True,
@@ -56,7 +130,7 @@ def setup_groq_agent(groq_api_key):
         # Create the multi-agent system
         multi_agent = Agent(
             team=[web_agent, finance_agent],
-            model=groq_model,
+            model=build_groq_model(groq_api_key, http_client),
             instructions=[
                 "Combine financial data with news analysis",
                 "Present information in a clear, organized format",
@@ -73,21 +147,314 @@ def setup_groq_agent(groq_api_key):
         raise
 
 
+def build_stock_prompt(symbol):
+    """
+    Build the analysis prompt for a single stock
+
+    Args:
+        symbol: Stock symbol to analyze
+    """
+    return f"""
+    Provide a comprehensive analysis of {symbol} including:
+    1. Current analyst recommendations and price targets
+   Present the information in a clear, organized format using tables where appropriate.
+    """
+
+
+def build_grounded_stock_prompt(symbol, market_data):
+    """
+    Build the analysis prompt for a stock with its market data included
+
+    Args:
+        symbol: Stock symbol to analyze
+        market_data: JSON market data from ParallelYFinanceTools.get_stock_overview
+    """
+    return f"""{build_stock_prompt(symbol)}
+    Base the analysis only on this current market data for {symbol}:
+    {market_data}
+    """
+
+
+def run_team_parallel(team, prompt):
+    """
+    Run every team member on the same prompt concurrently
+
+    Args:
+        team: List of agents to run
+        prompt: Prompt sent to each agent
+
+    Returns:
+        Dict mapping agent name to its response content
+    """
+    with ThreadPoolExecutor(max_workers=len(team)) as executor:
+        futures = {member.name: executor.submit(member.run, prompt) for member in team}
+        return {name: future.result().content for name, future in futures.items()}
+
+
 def analyze_stock(agent, symbol):
     """
     Analyze a stock using the multi-agent system
 
+    The web and finance agents are independent, so they are run concurrently
+    and their findings are handed to the lead model for the final answer.
+
     Args:
         agent: Configured multi-agent
         symbol: Stock symbol to analyze
     """
-    prompt = f"""
-    Provide a comprehensive analysis of {symbol} including:
+    prompt = build_stock_prompt(symbol)
+
+    research = run_team_parallel(agent.team, prompt)
+    findings = "\n\n".join(
+        f"### Findings from {name}\n{content}" for name, content in research.items()
+    )
+
+    # Lead agent without a team so it summarizes instead of delegating again
+    lead_agent = Agent(
+        model=build_groq_model(agent.model.api_key, agent.model.http_client),
+        instructions=agent.instructions,
+        markdown=True,
+    )
+
+    return lead_agent.print_response(f"{prompt}\n\n{findings}", stream=True)
+
+
+def analyze_stocks_batch(agent, symbols, sla_seconds=300, poll_interval=10):
+    """
+    Analyze several stocks in one Groq batch job
+
+    All prompts are submitted as a single JSONL batch, which avoids one round
+    trip per symbol. Batch requests go straight to the model without tools, so
+    each prompt carries market data fetched from YFinance beforehand. Falls back to a regular agent run per symbol when only one
+    symbol is given or the batch does not finish within the SLA.
+
+    Args:
+        agent: Configured multi-agent
+        symbols: Stock symbols to analyze
+        sla_seconds: Maximum time to wait for the batch before falling back
+        poll_interval: Seconds between batch status checks
+
+    Returns:
+        Dict mapping each symbol to its analysis
+    """
+    # Batch custom_ids must be unique
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    if len(symbols) == 1:
+        return {symbols[0]: agent.run(build_stock_prompt(symbols[0])).content}
+
+    # Batch requests have no tools, so fetch the market data up front and put
+    # it in the prompts; otherwise they'd be answered from the model's memory
+    # while fallback runs use live data
+    tools = ParallelYFinanceTools(
+        stock_price=True, analyst_recommendations=True, stock_fundamentals=True
+    )
+    with ThreadPoolExecutor(max_workers=min(len(symbols), 8)) as executor:
+        market_data = dict(
+            zip(symbols, executor.map(tools.get_stock_overview, symbols))
+        )
+
+    system_prompt = "\n".join(agent.instructions or [])
+    requests = [
+        {
+            "custom_id": symbol,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": agent.model.id,
+                "temperature": agent.model.temperature,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {
+                        "role": "user",
+                        "content": build_grounded_stock_prompt(
+                            symbol, market_data[symbol]
+                        ),
+                    },
+                ],
+            },
+        }
+        for symbol in symbols
+    ]
+    batch_input = "\n".join(json.dumps(request) for request in requests)
+
+    client = GroqClient(
+        api_key=agent.model.api_key, http_client=agent.model.http_client
+    )
+    input_file = client.files.create(
+        file=("stock_batch.jsonl", batch_input.encode()), purpose="batch"
+    )
+    batch = client.batches.create(
+        completion_window="24h",
+        endpoint="/v1/chat/completions",
+        input_file_id=input_file.id,
+    )
+
+    deadline = time.monotonic() + sla_seconds
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+
+    results = {}
+    if batch.status == "completed" and batch.output_file_id:
+        output = client.files.content(batch.output_file_id).text()
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                message = response["body"]["choices"][0]["message"]
+                results[record["custom_id"]] = message["content"]
+    else:
+        logging.warning(
+            f"Batch {batch.id} ended as '{batch.status}', falling back to agent runs"
+        )
+        if batch.status not in ("failed", "expired", "cancelled"):
+            client.batches.cancel(batch.id)
+
+    for symbol in symbols:
+        if symbol not in results:
+            results[symbol] = agent.run(build_stock_prompt(symbol)).content
+
+    return results
+
+
+def build_batch_prompt(symbols):
+    """
+    Build one analysis prompt covering several stocks
+
+    Args:
+        symbols: Stock symbols to analyze
+    """
+    return f"""
+    Provide a comprehensive analysis of each of these stocks: {", ".join(symbols)}.
+    For each stock include:
     1. Current analyst recommendations and price targets
    Present the information in a clear, organized format using tables where appropriate.
+    Start each stock's section with a heading line of the form "## SYMBOL".
     """
 
-    return agent.print_response(prompt, stream=True)
+
+def split_batch_response(content, symbols):
+    """
+    Split a combined analysis into per-symbol sections
+
+    Symbols without their own "## SYMBOL" section get the full response.
+
+    Args:
+        content: Response to a prompt from build_batch_prompt
+        symbols: Stock symbols that were requested
+    """
+    sections = {}
+    current = None
+    for line in content.splitlines():
+        heading = re.match(r"^##\s+([A-Za-z0-9.\-]+)", line)
+        if heading and heading.group(1).upper() in symbols:
+            current = heading.group(1).upper()
+            sections[current] = []
+        if current is not None:
+            sections[current].append(line)
+
+    return {
+        symbol: "\n".join(sections[symbol]) if symbol in sections else content
+        for symbol in symbols
+    }
+
+
+class StockAnalysisBatcher:
+    """
+    Coalesce concurrent analyze requests into a single agent call
+
+    Requests are queued and flushed together once batch_size symbols are
+    waiting or max_wait seconds have passed since the first one, whichever
+    comes first. Only one batch runs at a time; requests that arrive meanwhile
+    keep queueing and go out together when it finishes. Each batch gets a fresh
+    agent so run history doesn't pile up in a long-lived one. Each caller gets
+    back the section for its own symbol.
+
+    Args:
+        groq_api_key: Your Groq API key
+        max_wait: Seconds to wait for more requests before flushing
+        batch_size: Maximum number of symbols sent in one agent call
+    """
+
+    def __init__(self, groq_api_key, max_wait=0.05, batch_size=8):
+        self.groq_api_key = groq_api_key
+        self.max_wait = max_wait
+        self.batch_size = batch_size
+        self._pending = []
+        self._flush_timer = None
+        self._running = False
+        # Strong references so running batch tasks aren't garbage-collected
+        self._tasks = set()
+
+    async def analyze(self, symbol):
+        """
+        Queue a stock for analysis and wait for its result
+
+        Args:
+            symbol: Stock symbol to analyze
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((symbol.upper(), future))
+
+        # While a batch is running, requests just queue; it flushes them
+        if not self._running:
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+            elif self._flush_timer is None:
+                self._flush_timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._running or not self._pending:
+            return
+
+        batch = self._pending[: self.batch_size]
+        self._pending = self._pending[self.batch_size :]
+        self._running = True
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        try:
+            await self._analyze_batch(batch)
+        finally:
+            self._running = False
+            # Send whatever queued up while this batch was running
+            self._flush()
+
+    async def _analyze_batch(self, batch):
+        symbols = list(dict.fromkeys(symbol for symbol, _ in batch))
+        if len(symbols) == 1:
+            prompt = build_stock_prompt(symbols[0])
+        else:
+            prompt = build_batch_prompt(symbols)
+
+        try:
+            agent = await asyncio.to_thread(setup_groq_agent, self.groq_api_key)
+            response = await asyncio.to_thread(agent.run, prompt)
+            results = split_batch_response(response.content, symbols)
+        except Exception as e:
+            logging.error(f"Batched analysis of {symbols} failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for symbol, future in batch:
+            if not future.done():
+                future.set_result(results[symbol])
 
 
 # Usage example
@@ -96,8 +463,11 @@ if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
 
     try:
-        # Replace with your actual Groq API key
-        GROQ_API_KEY = "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"
+        # Read the Groq API key from the environment (or a .env file)
+        load_dotenv()
+        GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+        if not GROQ_API_KEY:
+            raise ValueError("GROQ_API_KEY is not set")
 
         # Set up and run the analysis
         agent = setup_groq_agent(GROQ_API_KEY)